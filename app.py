@@ -1,19 +1,39 @@
 import os
-import json
-import uuid
+import re
+import time
+import asyncio
+import hashlib
 
-from flask import Flask, render_template, request
-import psycopg2
+import httpx
+import orjson
+from quart import Quart, Response, request, stream_template
+from quart.json.provider import JSONProvider
+import psycopg
+from psycopg.types.json import Jsonb
+from psycopg_pool import AsyncConnectionPool
 from dotenv import load_dotenv
+from tenacity import (
+    retry,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_exponential_jitter,
+)
 
 from google import genai
-from google.genai import types
-from pydantic import BaseModel, Field
+from google.genai import errors, types
 
 # ---------------------------------
 # App setup
 # ---------------------------------
-app = Flask(__name__)
+class OrJSONProvider(JSONProvider):
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+app = Quart(__name__)
+app.json = OrJSONProvider(app)
 load_dotenv()
 
 # ---------------------------------
@@ -29,157 +49,312 @@ DB_USER = os.getenv("DB_USER")
 DB_PASSWORD = os.getenv("DB_PASSWORD")
 DB_SSLMODE = os.getenv("DB_SSLMODE", "require")
 
+# Bounds on feedback text: the cap keeps Gemini token usage (and tail
+# latency) predictable, the floor rejects junk submissions, and texts
+# too short to analyze skip the model entirely.
+FEEDBACK_MAX_LEN = 4000
+FEEDBACK_MIN_LEN = 5
+FEEDBACK_TRIVIAL_LEN = 15
+
+# Short feedback with an unambiguous sentiment keyword ("great
+# product", "terrible service") is classified without a model call.
+FEEDBACK_HEURISTIC_LEN = 80
+_POSITIVE_RE = re.compile(
+    r"\b(great|excellent|awesome|amazing|fantastic|perfect|love[ds]?)\b",
+    re.IGNORECASE,
+)
+_NEGATIVE_RE = re.compile(
+    r"\b(terrible|awful|horrible|worst|useless|broken|hate[ds]?)\b",
+    re.IGNORECASE,
+)
+
+# One client for the process: reuses the underlying HTTP session
+# instead of paying a TLS handshake per call. HTTP/2 multiplexes the
+# concurrent analyses over a few keep-alive connections.
+_HTTPX_ARGS = {
+    "http2": True,
+    "limits": httpx.Limits(
+        max_connections=32,
+        max_keepalive_connections=16,
+    ),
+    "timeout": 10.0,
+}
+
+GENAI_CLIENT = (
+    genai.Client(
+        api_key=GEMINI_API_KEY,
+        http_options=types.HttpOptions(
+            client_args=_HTTPX_ARGS,
+            async_client_args=_HTTPX_ARGS,
+        ),
+    )
+    if GEMINI_API_KEY
+    else None
+)
+
 # ---------------------------------
-# DB connection
+# DB connection pool
 # ---------------------------------
-def get_db_connection():
-    return psycopg2.connect(
+# Opened in startup() — AsyncConnectionPool needs a running event loop.
+POOL = AsyncConnectionPool(
+    conninfo=psycopg.conninfo.make_conninfo(
         host=DB_HOST,
         port=DB_PORT,
         dbname=DB_NAME,
         user=DB_USER,
         password=DB_PASSWORD,
         sslmode=DB_SSLMODE,
-    )
+    ),
+    min_size=2,
+    max_size=16,
+    open=False,
+)
+
+# Executed with prepare=True so psycopg keeps a server-side prepared
+# statement per pooled connection: parse+plan is paid once.
+INSERT_SQL = """
+    INSERT INTO feedbacks
+    (customer_name, product_name, original_feedback,
+     summary, issues, sentiment)
+    VALUES (%s, %s, %s, %s, %s, %s)
+    RETURNING feedback_id
+"""
 
 # ---------------------------------
-# Gemini response schema
+# Schema setup (one-shot, at startup)
 # ---------------------------------
-class FeedbackAnalysis(BaseModel):
-    summary: str = Field(description="2-3 line summary")
-    issues: list[str] = Field(description="List of issues")
-    sentiment: str = Field(description="Positive, Neutral, or Negative")
+async def init_db():
+    async with POOL.connection() as conn:
+        await conn.execute("""
+            CREATE EXTENSION IF NOT EXISTS "pgcrypto";
+
+            CREATE TABLE IF NOT EXISTS feedbacks (
+                id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+                feedback_id UUID DEFAULT gen_random_uuid(),
+                customer_name TEXT,
+                product_name TEXT NOT NULL,
+                original_feedback TEXT NOT NULL,
+                summary TEXT,
+                issues JSONB,
+                sentiment TEXT,
+                created_at TIMESTAMPTZ DEFAULT now()
+            );
+        """)
 
 # ---------------------------------
 # Gemini summarization
 # ---------------------------------
-def summarize_with_gemini(feedback_text: str) -> dict:
-    if not GEMINI_API_KEY:
-        return {
-            "summary": "Gemini API key missing.",
-            "issues": [],
-            "sentiment": "Neutral",
-        }
-
-    prompt = f"""
-Analyze the customer feedback below.
-
-Return ONLY valid JSON with this schema:
-{{
-  "summary": "",
-  "issues": [],
-  "sentiment": ""
-}}
-
-Rules:
-- summary: 2–3 short lines
-- issues: short bullet points
-- sentiment: Positive, Neutral, or Negative
-
-Feedback:
-{feedback_text}
-"""
+# Static prompt prefix, built once. Keeping the prefix byte-identical
+# across calls also makes the prompt eligible for server-side context
+# caching.
+PROMPT_HEAD = (
+    "Analyze this customer feedback. Return ONLY JSON: "
+    '{"summary": "2-3 short lines", "issues": ["short bullet points"], '
+    '"sentiment": "Positive|Neutral|Negative"}\n\n'
+    "Feedback:\n"
+)
+
+# Static (summary, issues, sentiment) results for the no-key and
+# API-error paths — built once instead of allocating a dict per call.
+_GEMINI_NOKEY = ("Gemini API key missing.", (), "Neutral")
+_GEMINI_FAIL = ("AI analysis failed.", ("Gemini API error",), "Neutral")
+
+# Exact-match cache: repeat feedback ("great product", "didn't work")
+# skips the Gemini call entirely. Only touched between awaits on the
+# event loop, so no lock is needed.
+ANALYSIS_CACHE = {}
+ANALYSIS_CACHE_MAX = 4096
+
+def _cache_key(feedback_text: str) -> str:
+    return hashlib.blake2b(feedback_text.encode(), digest_size=16).hexdigest()
+
+# Timeouts and transient server errors are retried with jittered
+# exponential backoff; anything else fails straight through to the
+# caller's error handling.
+@retry(
+    stop=stop_after_attempt(3),
+    wait=wait_exponential_jitter(initial=1, max=4),
+    retry=retry_if_exception_type((httpx.TimeoutException, errors.ServerError)),
+    reraise=True,
+)
+async def _generate_analysis(prompt: str):
+    return await GENAI_CLIENT.aio.models.generate_content(
+        model=GEMINI_MODEL,
+        contents=prompt,
+        config=types.GenerateContentConfig(
+            response_mime_type="application/json",
+            temperature=0.2,
+            max_output_tokens=256,
+        ),
+    )
+
+async def summarize_with_gemini(feedback_text: str) -> tuple:
+    """Return a (summary, issues, sentiment) tuple for the feedback."""
+    if GENAI_CLIENT is None:
+        return _GEMINI_NOKEY
+
+    # Too short to summarize — not worth a model call.
+    if len(feedback_text) < FEEDBACK_TRIVIAL_LEN:
+        return (feedback_text, (), "Neutral")
+
+    # Short texts with exactly one sentiment polarity are classified
+    # directly; mixed or keyword-free texts still go to the model.
+    if len(feedback_text) <= FEEDBACK_HEURISTIC_LEN:
+        positive = _POSITIVE_RE.search(feedback_text) is not None
+        negative = _NEGATIVE_RE.search(feedback_text) is not None
+        if positive != negative:
+            return (feedback_text, (), "Positive" if positive else "Negative")
+
+    key = _cache_key(feedback_text)
+    cached = ANALYSIS_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    prompt = PROMPT_HEAD + feedback_text
 
     try:
-        client = genai.Client(api_key=GEMINI_API_KEY)
-        response = client.models.generate_content(
-            model=GEMINI_MODEL,
-            contents=prompt,
-            config=types.GenerateContentConfig(
-                response_mime_type="application/json",
-                response_schema=FeedbackAnalysis,
-                temperature=0.2,
-            ),
+        response = await _generate_analysis(prompt)
+
+        data = orjson.loads(response.text)
+        result = (
+            data.get("summary", ""),
+            data.get("issues", []),
+            data.get("sentiment", "Neutral").title(),
         )
 
-        data = json.loads(response.text)
-        return {
-            "summary": data.get("summary", ""),
-            "issues": data.get("issues", []),
-            "sentiment": data.get("sentiment", "Neutral").title(),
-        }
+        # Only successful analyses are cached, so transient API
+        # failures are retried on the next identical submission.
+        if len(ANALYSIS_CACHE) >= ANALYSIS_CACHE_MAX:
+            ANALYSIS_CACHE.clear()
+        ANALYSIS_CACHE[key] = result
+
+        return result
 
     except Exception as e:
         print("Gemini error:", e)
-        return {
-            "summary": "AI analysis failed.",
-            "issues": ["Gemini API error"],
-            "sentiment": "Neutral",
-        }
+        return _GEMINI_FAIL
+
+# ---------------------------------
+# Background analysis worker
+# ---------------------------------
+# Finished analyses are queued and written in batches: one pipelined
+# executemany instead of one round trip per row.
+UPDATE_QUEUE = asyncio.Queue()
+BATCH_SIZE = 64
+BATCH_MS = 100
+
+async def analyze_feedback(feedback_id: str, feedback_text: str):
+    summary, issues, sentiment = await summarize_with_gemini(feedback_text)
+    await UPDATE_QUEUE.put((summary, Jsonb(list(issues)), sentiment, feedback_id))
+
+async def flush_analysis_batch(rows):
+    try:
+        async with POOL.connection() as conn:
+            async with conn.cursor() as cur:
+                async with conn.pipeline():
+                    await cur.executemany(
+                        """
+                        UPDATE feedbacks
+                        SET summary = %s, issues = %s, sentiment = %s
+                        WHERE feedback_id = %s
+                        """,
+                        rows,
+                    )
+    except Exception as e:
+        print("Batch update error:", e)
+
+async def analysis_writer():
+    while True:
+        rows = [await UPDATE_QUEUE.get()]
+        deadline = time.monotonic() + BATCH_MS / 1000
+        while len(rows) < BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                rows.append(
+                    await asyncio.wait_for(UPDATE_QUEUE.get(), timeout=remaining)
+                )
+            except asyncio.TimeoutError:
+                break
+        await flush_analysis_batch(rows)
+
+@app.before_serving
+async def startup():
+    await POOL.open()
+    await init_db()
+    app.add_background_task(analysis_writer)
+
+@app.after_serving
+async def shutdown():
+    await POOL.close()
 
 # ---------------------------------
 # Routes
 # ---------------------------------
+async def render_index(message, status=200):
+    # Streamed render: bytes go out as Jinja produces them instead of
+    # buffering the whole page, cutting time-to-first-byte.
+    return Response(
+        await stream_template("index.html", message=message),
+        status=status,
+        mimetype="text/html",
+    )
+
 @app.route("/", methods=["GET", "POST"])
-def index():
+async def index():
     message = None
 
     if request.method == "POST":
-        customer_name = request.form.get("customer_name", "").strip()
-        product_name = request.form.get("product_name", "").strip()
-        feedback_text = request.form.get("feedback_text", "").strip()
+        form = await request.form
+        customer_name = form.get("customer_name", "").strip()
+        product_name = form.get("product_name", "").strip()
+        feedback_text = form.get("feedback_text", "").strip()
 
         if not product_name or not feedback_text:
             message = "Product name and feedback are required."
-            return render_template("index.html", message=message)
+            return await render_index(message, status=400)
 
-        analysis = summarize_with_gemini(feedback_text)
-        feedback_id = str(uuid.uuid4())
+        feedback_text = feedback_text[:FEEDBACK_MAX_LEN]
+        if len(feedback_text) < FEEDBACK_MIN_LEN:
+            message = "Feedback is too short."
+            return await render_index(message, status=400)
 
         try:
-            conn = get_db_connection()
-            cur = conn.cursor()
-
-            # Create table (PostgreSQL)
-            cur.execute("""
-                CREATE EXTENSION IF NOT EXISTS "pgcrypto";
-
-                CREATE TABLE IF NOT EXISTS feedbacks (
-                    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
-                    feedback_id UUID,
-                    customer_name TEXT,
-                    product_name TEXT NOT NULL,
-                    original_feedback TEXT NOT NULL,
-                    summary TEXT,
-                    issues TEXT,
-                    sentiment TEXT,
-                    created_at TIMESTAMPTZ DEFAULT now()
-                );
-            """)
-
-            # Insert feedback
-            cur.execute(
-                """
-                INSERT INTO feedbacks
-                (feedback_id, customer_name, product_name, original_feedback,
-                 summary, issues, sentiment)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-                """,
-                (
-                    feedback_id,
-                    customer_name or None,
-                    product_name,
-                    feedback_text,
-                    analysis["summary"],
-                    ", ".join(analysis["issues"]),
-                    analysis["sentiment"],
-                ),
-            )
-
-            conn.commit()
-            cur.close()
-            conn.close()
-
-            message = "Feedback submitted successfully!"
+            async with POOL.connection() as conn:
+                async with conn.cursor() as cur:
+                    # Insert feedback; the DB default fills feedback_id
+                    # and the analysis fields are filled in later by the
+                    # background worker.
+                    await cur.execute(
+                        INSERT_SQL,
+                        (
+                            customer_name or None,
+                            product_name,
+                            feedback_text,
+                            None,
+                            None,
+                            "Pending",
+                        ),
+                        prepare=True,
+                        binary=True,
+                    )
+                    row = await cur.fetchone()
+                    feedback_id = str(row[0])
+
+            app.add_background_task(analyze_feedback, feedback_id, feedback_text)
+
+            message = "Feedback submitted successfully! Analysis is pending."
 
         except Exception as e:
             print("Database error:", e)
             message = "Database error. Check logs."
 
-    return render_template("index.html", message=message)
+    return await render_index(message)
 
 # ---------------------------------
-# Entry point
+# Entry point (dev only — production runs under hypercorn,
+# see hypercorn.toml)
 # ---------------------------------
 if __name__ == "__main__":
     app.run()